@@ -0,0 +1,284 @@
+# Standard library imports
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+# Third-party libraries are imported inside the functions that use them, like in main.py
+import main
+
+# Size of an A4 page in PDF points
+PAGE_WIDTH = 595
+PAGE_HEIGHT = 842
+
+# Version of the JSON result layout, bump it when fields change meaning
+RESULTS_VERSION = 1
+
+def make_roster_pdf(pdf_path, pages=20, dpi=150, skew=1.5, noise=8.0, seed=0, quality=85):
+    import cv2
+    import fitz  # PyMuPDF
+    import numpy as np
+
+    # Draw a clean roster page, then turn it into a skewed, noisy JPEG "scan" of that page
+    rng = np.random.default_rng(seed)
+    zoom = dpi / main.BASE_DPI
+    source = fitz.open()
+    output = fitz.open()
+    for page_num in range(pages):
+        page = source.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+
+        # Name field at NAME_CROP_BOX, framed like on the printed forms
+        name_box = fitz.Rect(main.NAME_CROP_BOX)
+        page.draw_rect(name_box, color=(0, 0, 0), width=1)
+        page.insert_text(name_box.tl + (6, 15), f"Uczen {page_num + 1:04d}", fontsize=11)
+        page.insert_text(name_box.tl + (6, 30), f"Klasa {page_num % 8 + 1}a", fontsize=11)
+
+        # Table rows and columns give the deskew step long straight lines to find
+        for y in range(70, PAGE_HEIGHT - 40, 24):
+            page.draw_line((40, y), (PAGE_WIDTH - 40, y), color=(0, 0, 0), width=1)
+        for x in (40, 90, 380, PAGE_WIDTH - 40):
+            page.draw_line((x, 70), (x, 70 + 24 * ((PAGE_HEIGHT - 110) // 24)), color=(0, 0, 0), width=1)
+
+        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY, alpha=False)
+        scan = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.stride)[:, :pix.width]
+
+        # Rotate around the page center, the same way correct_skew undoes it
+        (h, w) = scan.shape
+        M = cv2.getRotationMatrix2D((w // 2, h // 2), skew, 1.0)
+        scan = cv2.warpAffine(scan, M, (w, h), flags=cv2.INTER_LINEAR, borderValue=255)
+        if noise > 0:
+            scan = np.clip(scan + rng.normal(0, noise, scan.shape), 0, 255).astype(np.uint8)
+
+        ok, jpeg = cv2.imencode(".jpg", scan, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        out_page = output.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+        out_page.insert_image(out_page.rect, stream=jpeg.tobytes())
+
+    output.save(pdf_path, garbage=3, deflate=True)
+    output.close()
+    source.close()
+
+def time_call(func, repeat):
+    # Wall time of each call; the last result is returned so stages can be chained
+    seconds = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        seconds.append(time.perf_counter() - start)
+    return seconds, result
+
+def summarize(seconds, pages):
+    best = min(seconds)
+    return {
+        "seconds": seconds,
+        "median": statistics.median(seconds),
+        "best": best,
+        "pages_per_second": pages / best if best > 0 else None,
+    }
+
+def benchmark_stages(pdf_path, dpi=main.BASE_DPI, repeat=3):
+    # Time every stage of the pipeline on its own, feeding it the previous stage's output
+    crop_box = main.name_crop_box(dpi)
+    stages = {}
+
+    # Every render pass opens the PDF again so MuPDF's image cache does not carry over
+    pages = main.count_pages(pdf_path)
+    seconds, images = time_call(lambda: main.pdf_to_images(pdf_path, dpi), repeat)
+    stages["render_page"] = summarize(seconds, pages)
+    seconds, _ = time_call(lambda: main.pdf_to_images(pdf_path, dpi, main.NAME_CROP_BOX, main.CLIP_PADDING), repeat)
+    stages["render_page_clip"] = summarize(seconds, pages)
+    seconds, _ = time_call(lambda: list(main.iter_pdf_pages(pdf_path, lambda page: main.fast_deskew_name(page, dpi))), repeat)
+    stages["fast_deskew_name"] = summarize(seconds, pages)
+    seconds, _ = time_call(lambda: list(main.iter_pdf_pages(pdf_path, lambda page: main.scan_name_crop(page, dpi))), repeat)
+    stages["scan_name_crop"] = summarize(seconds, pages)
+
+    seconds, corrected = time_call(lambda: [main.correct_skew(img) for img in images], repeat)
+    stages["correct_skew"] = summarize(seconds, pages)
+    seconds, crops = time_call(lambda: [main.crop_image(img, crop_box) for img in corrected], repeat)
+    stages["crop_image"] = summarize(seconds, pages)
+    seconds, _ = time_call(lambda: [main.enhance_image_reference(img) for img in crops], repeat)
+    stages["enhance_image_reference"] = summarize(seconds, pages)
+    seconds, enhanced = time_call(lambda: [main.enhance_image(img) for img in crops], repeat)
+    stages["enhance_image"] = summarize(seconds, pages)
+    seconds, _ = time_call(lambda: main.enhance_images(crops), repeat)
+    stages["enhance_images"] = summarize(seconds, pages)
+
+    for encoding in main.ENCODINGS:
+        seconds, encoded = time_call(lambda: [main.encode_image(img, encoding) for img in enhanced], repeat)
+        stages["encode_image_" + encoding] = summarize(seconds, pages)
+        stages["encode_image_" + encoding]["output_bytes"] = sum(len(data.getvalue()) for data in encoded)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_path = os.path.join(tmp_dir, "stage.xlsx")
+        seconds, _ = time_call(lambda: main.insert_images_to_excel(enhanced, output_path), repeat)
+        stages["insert_images_to_excel"] = summarize(seconds, pages)
+        stages["insert_images_to_excel"]["output_bytes"] = os.path.getsize(output_path)
+        seconds, _ = time_call(lambda: main.insert_images_to_excel(enhanced, output_path, encode_workers=1), repeat)
+        stages["insert_images_to_excel_serial_encode"] = summarize(seconds, pages)
+
+    return stages
+
+def peak_rss_mb():
+    # Peak resident memory of this process. On Linux ru_maxrss is carried over through the
+    # fork+exec that starts a spawned process, so it would report the benchmark parent's
+    # high-water mark; VmHWM belongs to the process's own address space instead
+    if sys.platform.startswith("linux"):
+        try:
+            with open("/proc/self/status", encoding="ascii") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        return int(line.split()[1]) / 1024
+        except OSError:
+            return None
+        return None
+    if sys.platform == "darwin":
+        import resource
+
+        # ru_maxrss is in bytes on macOS
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2 ** 20
+    # No getrusage on Windows, peak memory is not reported there
+    return None
+
+def run_pipeline(pdf_path, output_path, options, repeat, connection):
+    # Runs in a fresh process so its peak memory belongs to this pipeline variant only
+    seconds, _ = time_call(lambda: main.process_pdf_to_excel(pdf_path, output_path, **options), repeat)
+    result = {"seconds": seconds, "output_bytes": os.path.getsize(output_path)}
+    peak = peak_rss_mb()
+    if peak is not None:
+        result["peak_rss_mb"] = peak
+    try:
+        import resource
+    except ImportError:
+        pass
+    else:
+        # Worker processes are forked from this one, so their peak includes the pages they share with it
+        unit = 1 if sys.platform == "darwin" else 1024
+        result["peak_worker_rss_mb"] = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit / 2 ** 20
+    connection.send(result)
+    connection.close()
+
+def benchmark_pipeline(pdf_path, pages, variants, repeat=3):
+    context = multiprocessing.get_context("spawn")
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, options in variants.items():
+            receiver, sender = context.Pipe(duplex=False)
+            output_path = os.path.join(tmp_dir, name + ".xlsx")
+            process = context.Process(target=run_pipeline, args=(pdf_path, output_path, options, repeat, sender))
+            process.start()
+            sender.close()
+            result = receiver.recv()
+            process.join()
+
+            summary = summarize(result.pop("seconds"), pages)
+            summary.update(result)
+            summary["options"] = options
+            results[name] = summary
+    return results
+
+def pipeline_variants(dpi=main.BASE_DPI, workers=None):
+    variants = {
+        "serial": {"dpi": dpi, "workers": 1},
+        "serial_clip": {"dpi": dpi, "workers": 1, "clip": True},
+        "serial_fast_deskew": {"dpi": dpi, "workers": 1, "fast_deskew": True},
+        "serial_extract_scans": {"dpi": dpi, "workers": 1, "extract_scans": True},
+        "serial_palette": {"dpi": dpi, "workers": 1, "encoding": "palette"},
+        "serial_bilevel": {"dpi": dpi, "workers": 1, "encoding": "bilevel"},
+    }
+    if workers is not None and workers > 1:
+        variants["parallel"] = {"dpi": dpi, "workers": workers}
+        variants["parallel_fast_deskew"] = {"dpi": dpi, "workers": workers, "fast_deskew": True}
+    return variants
+
+def environment():
+    import cv2
+    import fitz  # PyMuPDF
+    import numpy as np
+    import openpyxl
+    import PIL
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "libraries": {
+            "opencv": cv2.__version__,
+            "pymupdf": fitz.VersionBind,
+            "numpy": np.__version__,
+            "pillow": PIL.__version__,
+            "openpyxl": openpyxl.__version__,
+        },
+    }
+
+def compare(results, baseline):
+    # Print current/baseline time ratios for every stage and pipeline variant both files have
+    for section in ("stages", "pipeline"):
+        for name, current in results.get(section, {}).items():
+            previous = baseline.get(section, {}).get(name)
+            if previous is None:
+                continue
+            ratio = current["best"] / previous["best"] if previous["best"] else float("nan")
+            line = f"{section}/{name}: {previous['best']:.3f}s -> {current['best']:.3f}s ({ratio:.2f}x)"
+            if "peak_rss_mb" in current and "peak_rss_mb" in previous:
+                line += f", peak RSS {previous['peak_rss_mb']:.0f} -> {current['peak_rss_mb']:.0f} MB"
+            print(line)
+
+def run_benchmarks(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the PDF to xlsx conversion on synthetic roster scans.")
+    parser.add_argument("--pdf", help="benchmark this PDF instead of generating one")
+    parser.add_argument("--pages", type=int, default=50, help="pages of the synthetic PDF (default: %(default)s)")
+    parser.add_argument("--scan-dpi", type=int, default=150, help="resolution of the synthetic scans (default: %(default)s)")
+    parser.add_argument("--skew", type=float, default=1.5, help="skew of the synthetic scans in degrees (default: %(default)s)")
+    parser.add_argument("--noise", type=float, default=8.0, help="gaussian noise level of the synthetic scans (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed of the synthetic scans (default: %(default)s)")
+    parser.add_argument("--dpi", type=int, default=main.BASE_DPI, help="conversion rendering resolution (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes for the parallel variants (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement (default: %(default)s)")
+    parser.add_argument("--skip-stages", action="store_true", help="only benchmark the full pipeline")
+    parser.add_argument("-o", "--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON results to compare against")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        config = {"dpi": args.dpi, "workers": args.workers, "repeat": args.repeat}
+        if args.pdf:
+            pdf_path = args.pdf
+            config["pdf"] = os.path.basename(pdf_path)
+        else:
+            pdf_path = os.path.join(tmp_dir, "roster.pdf")
+            make_roster_pdf(pdf_path, args.pages, args.scan_dpi, args.skew, args.noise, args.seed)
+            config["synthetic"] = {"pages": args.pages, "scan_dpi": args.scan_dpi, "skew": args.skew, "noise": args.noise, "seed": args.seed}
+        pages = main.count_pages(pdf_path)
+        config["pages"] = pages
+
+        results = {
+            "version": RESULTS_VERSION,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "environment": environment(),
+            "config": config,
+        }
+        if not args.skip_stages:
+            results["stages"] = benchmark_stages(pdf_path, args.dpi, args.repeat)
+        results["pipeline"] = benchmark_pipeline(pdf_path, pages, pipeline_variants(args.dpi, args.workers), args.repeat)
+
+    for section in ("stages", "pipeline"):
+        for name, summary in results.get(section, {}).items():
+            print(f"{section}/{name}: {summary['best']:.3f}s, {summary['pages_per_second'] or 0:.1f} pages/s")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(results, json.load(f))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(run_benchmarks())
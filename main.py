@@ -1,21 +1,94 @@
 # Standard library imports
 import io
 import os
+import sys
+import queue
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+from functools import lru_cache
+from itertools import chain, count
 
-# Third-party library imports
-import cv2
-import fitz  # PyMuPDF
-import numpy as np
-from PIL import Image, ImageEnhance
-from openpyxl import Workbook, load_workbook
-from openpyxl.drawing.image import Image as OpenpyxlImage
-from openpyxl.styles import Border, Side, Alignment, Font
-from openpyxl.utils import get_column_letter
-
-# Interface imports
-import tkinter as tk
-from tkinterdnd2 import DND_FILES, TkinterDnD
-from tkinter import filedialog
+# Third-party libraries (cv2, fitz, numpy, PIL, openpyxl) and the Tk interface are
+# imported inside the functions that use them, so the command line starts quickly
+# and never loads tkinter
+
+# Crop box of the name field, in PDF points (pixels of a 72 DPI render)
+NAME_CROP_BOX = (152, 10, 325, 46)
+
+# Resolution the crop box coordinates are expressed in
+BASE_DPI = 72
+
+# Margin rendered around the crop box in clip mode, in PDF points; it has to cover how far
+# the deskew rotation around the page center moves the name region (about 22 points at 3 degrees)
+CLIP_PADDING = 24
+
+# Number of rendered pages allowed to wait ahead of the processing stages
+PIPELINE_WINDOW = 2
+
+# Number of pages handed to a worker process at once in parallel mode
+CHUNK_SIZE = 8
+
+# Resolution the page is rendered at to estimate the skew angle in fast deskew mode
+SKEW_DPI = 36
+
+# Largest accepted difference between the fast and full-resolution skew angles, in degrees
+# (one step of the 1 degree Hough angle resolution)
+SKEW_TOLERANCE = 1.0
+
+# Minimum Hough votes for a line at BASE_DPI; scaled with the resolution in fast mode
+HOUGH_THRESHOLD = 200
+
+# PDF filters whose stream is a plain JPEG file that can be decoded at a reduced scale
+JPEG_FILTERS = ("/DCTDecode", "[/DCTDecode]")
+
+# Environment variable that turns on the stage profiler for every conversion when set to 1
+PROFILE_ENV = "KREATOR_PROFILE"
+
+# Settings of the enhance_image step
+CONTRAST_FACTOR = 3
+BRIGHTNESS_FACTOR = 0.6
+CLAHE_CLIP_LIMIT = 2.0
+CLAHE_TILE_GRID = (8, 8)
+
+# Largest accepted difference between enhance_images and the original PIL/OpenCV chain, in
+# gray levels; the fused tables reproduce PIL's arithmetic, so the results are identical
+ENHANCE_TOLERANCE = 0
+
+# Per-thread CLAHE objects reused across pages
+clahe_local = threading.local()
+
+# How the crops are stored in the workbook: "gray" (8-bit PNG), "palette" (PALETTE_COLORS
+# gray levels, 4-bit PNG) or "bilevel" (black and white, 1-bit PNG)
+ENCODINGS = ("gray", "palette", "bilevel")
+PALETTE_COLORS = 16
+
+# Threads encoding crops ahead of the workbook writer
+ENCODE_WORKERS = min(4, os.cpu_count() or 1)
+
+# Environment variable overriding where processed crops are cached between runs
+CACHE_DIR_ENV = "KREATOR_CACHE_DIR"
+
+# Size limit of the crop cache; least recently used crops are removed above it
+CACHE_MAX_BYTES = 256 * 2 ** 20
+
+# Age after which a temporary file left in the cache by an interrupted run is removed, in seconds
+CACHE_TMP_MAX_AGE = 3600
+
+# Bump when a change to the processing makes previously cached crops invalid
+CACHE_VERSION = 1
+
+# File chosen in the window
+input_file_path = ""
+
+# Background conversion started from the window, and the messages it sends back
+conversion_cancel = None
+conversion_messages = queue.Queue()
+
+class ConversionCancelled(Exception):
+    pass
 
 # Function to handle dropped files
 def drop(event):
@@ -51,8 +124,7 @@ def confirm():
         if input_file_path:
             save_file_path = filedialog.asksaveasfilename(defaultextension=".xlsx", filetypes=[("Excel files", "*.xlsx"), ("All files", "*.*")])
             if save_file_path:
-                process_pdf_to_excel(input_file_path, save_file_path)
-                label_file.config(text="Plik zapisano pomyślnie.")
+                start_conversion(input_file_path, save_file_path)
             else:
                 label_file.config(text="Operacje zapisywania anulowano")
         else:
@@ -62,22 +134,391 @@ def confirm():
     except Exception as e:
         label_file.config(text="Nieobsługiwany błąd: " + str(e))
 
-def process_pdf_to_excel(pdf_path, output_path=None):
-    # Constants for crop box coordinates
-    NAME_CROP_BOX = (152, 10, 325, 46)
+def start_conversion(pdf_path, output_path):
+    # Convert on a worker thread so the window stays responsive
+    global conversion_cancel
+    conversion_cancel = threading.Event()
+    confirm_button.config(state="disabled")
+    label_file.config(text="Przetwarzanie...")
+    # Tk variables may only be read on the Tk thread
+    cache = cache_enabled.get()
+    worker = threading.Thread(target=run_conversion, args=(pdf_path, output_path, conversion_cancel, cache), daemon=True)
+    worker.start()
+    root.after(100, poll_conversion)
+
+def run_conversion(pdf_path, output_path, cancel_event, cache=False):
+    # Runs on the worker thread; only talks to the window through conversion_messages
+    def progress(done, total):
+        conversion_messages.put(("progress", done, total))
+
+    try:
+        process_pdf_to_excel(pdf_path, output_path, workers=os.cpu_count(), progress=progress, cancel=cancel_event, cache=cache)
+        conversion_messages.put(("done", "Plik zapisano pomyślnie."))
+    except ConversionCancelled:
+        conversion_messages.put(("done", "Przetwarzanie anulowano."))
+    except FileNotFoundError as e:
+        conversion_messages.put(("done", "Błąd: " + str(e)))
+    except Exception as e:
+        conversion_messages.put(("done", "Nieobsługiwany błąd: " + str(e)))
+
+def poll_conversion():
+    # Apply the worker's messages on the Tk thread, then check again shortly
+    global conversion_cancel
+    while True:
+        try:
+            message = conversion_messages.get_nowait()
+        except queue.Empty:
+            break
+        if message[0] == "progress":
+            done, total = message[1:]
+            if not conversion_cancel.is_set():
+                label_file.config(text=f"Przetwarzanie strony {done} z {total}...")
+        else:
+            label_file.config(text=message[1])
+            confirm_button.config(state="normal")
+            conversion_cancel = None
+            return
+    root.after(100, poll_conversion)
 
+def process_pdf_to_excel(pdf_path, output_path=None, dpi=BASE_DPI, clip=False, padding=CLIP_PADDING, window=PIPELINE_WINDOW, workers=1, chunk_size=CHUNK_SIZE, fast_deskew=False, progress=None, cancel=None, profile=None, cache=False, extract_scans=False, encoding="gray", cell_height=None, encode_workers=ENCODE_WORKERS):
     if output_path is None:
         output_path = os.path.splitext(pdf_path)[0] + ".xlsx"
 
-    # Read PDF file and process images
-    images = pdf_to_images(pdf_path)
-    corrected_images = [correct_skew(img) for img in images]
-    cropped_names = [crop_image(img, NAME_CROP_BOX) for img in corrected_images]
-    enhanced_names = [enhance_image(img) for img in cropped_names]
-    create_table_structure(output_path)
-    insert_images_to_excel(enhanced_names, output_path)
+    if profile is None:
+        profile = os.environ.get(PROFILE_ENV, "0") not in ("", "0")
+    profiler = None
+    if profile:
+        # Profile on a single thread so every stage's time and memory peak can be attributed
+        profiler = StageProfiler()
+        profiler.start()
+        workers = 1
+        window = 1
+        encode_workers = 1
+
+    # Read PDF file and process images lazily, serially or across worker processes
+    def process(page_numbers=None):
+        if workers is not None and workers > 1:
+            return iter_name_crops_parallel(pdf_path, workers, chunk_size, dpi, clip, padding, fast_deskew, page_numbers, extract_scans, cancel)
+        return iter_name_crops(pdf_path, dpi, clip, padding, window, fast_deskew, profiler, page_numbers, extract_scans)
+
+    crop_cache = None
+    if cache:
+        # Only pages whose content or processing settings changed are processed again
+        crop_cache = CropCache(cache if isinstance(cache, str) else default_cache_dir())
+        enhanced_names = crop_cache.iter_crops(pdf_path, processing_key(dpi, clip, padding, fast_deskew, extract_scans), process, cancel)
+    else:
+        enhanced_names = process()
+    if progress is not None or cancel is not None:
+        enhanced_names = track_progress(enhanced_names, count_pages(pdf_path), progress, cancel)
+    try:
+        insert_images_to_excel(enhanced_names, output_path, profiler, encoding, cell_height, encode_workers)
+    finally:
+        if profiler is not None:
+            profiler.stop()
+
+    if profiler is not None:
+        profiler.write_report(os.path.splitext(output_path)[0] + ".profile.txt", pdf_path, output_path)
+    if crop_cache is not None:
+        crop_cache.trim()
+
+def track_progress(images, total, progress=None, cancel=None):
+    # Report each finished page and stop between pages once `cancel` (a threading.Event) is set
+    try:
+        for done, image in enumerate(images, start=1):
+            if cancel is not None and cancel.is_set():
+                raise ConversionCancelled()
+            yield image
+            if progress is not None:
+                progress(done, total)
+        if cancel is not None and cancel.is_set():
+            raise ConversionCancelled()
+    finally:
+        # Stop the upstream stages (prefetch thread, worker pool) right away
+        if hasattr(images, "close"):
+            images.close()
+
+class StageProfiler:
+    # Collects wall time, CPU time and traced allocation peaks for every stage call
+
+    def __init__(self):
+        self.records = []
+        self.peak = 0
+
+    def start(self):
+        # Load the libraries first, tracing their imports would dwarf the conversion itself
+        import cv2  # noqa: F401
+        import fitz  # noqa: F401
+        import numpy  # noqa: F401
+        import PIL.Image  # noqa: F401
+        import openpyxl  # noqa: F401
+
+        self.owns_tracing = not tracemalloc.is_tracing()
+        if self.owns_tracing:
+            tracemalloc.start()
+        self.started_wall = time.perf_counter()
+        self.started_cpu = time.process_time()
+
+    def stop(self):
+        self.wall = time.perf_counter() - self.started_wall
+        self.cpu = time.process_time() - self.started_cpu
+        self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+        if self.owns_tracing:
+            tracemalloc.stop()
+
+    @contextmanager
+    def measure(self, stage, page=None):
+        # The peak is reset per call, so the overall peak is tracked here as well
+        self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        wall = time.perf_counter()
+        cpu = time.thread_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall
+            cpu = time.thread_time() - cpu
+            peak = tracemalloc.get_traced_memory()[1]
+            self.peak = max(self.peak, peak)
+            self.records.append((stage, page, wall, cpu, peak - base))
+
+    def write_report(self, report_path, pdf_path, output_path):
+        stages = {}
+        pages = {}
+        for stage, page, wall, cpu, peak in self.records:
+            total = stages.setdefault(stage, [0, 0.0, 0.0, 0])
+            total[0] += 1
+            total[1] += wall
+            total[2] += cpu
+            total[3] = max(total[3], peak)
+            if page is not None:
+                pages.setdefault(page, {})[stage] = (wall, cpu, peak)
+
+        lines = [
+            f"PDF: {pdf_path}",
+            f"Workbook: {output_path}",
+            f"Pages: {len(pages)}",
+            f"Total: wall {self.wall:.3f} s, CPU {self.cpu:.3f} s, traced peak {self.peak / 2 ** 20:.1f} MB",
+            "",
+            f"{'stage':<14}{'calls':>7}{'wall s':>10}{'CPU s':>10}{'ms/call':>10}{'peak MB':>10}",
+        ]
+        for stage, (calls, wall, cpu, peak) in stages.items():
+            lines.append(f"{stage:<14}{calls:>7}{wall:>10.3f}{cpu:>10.3f}{wall / calls * 1000:>10.2f}{peak / 2 ** 20:>10.2f}")
+        # PDF opening, page loading and the generator glue are not part of any stage
+        lines.append(f"{'other':<14}{'':>7}{self.wall - sum(total[1] for total in stages.values()):>10.3f}")
+
+        # Per-page wall time, CPU time and allocation peak of every stage
+        lines += ["", f"{'page':<6}{'stage':<14}{'wall ms':>10}{'CPU ms':>10}{'peak MB':>10}"]
+        for page in sorted(pages):
+            for stage in stages:
+                if stage in pages[page]:
+                    wall, cpu, peak = pages[page][stage]
+                    lines.append(f"{page + 1:<6}{stage:<14}{wall * 1000:>10.2f}{cpu * 1000:>10.2f}{peak / 2 ** 20:>10.2f}")
+
+        with open(report_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+def profiled(profiler, stage, func, page_numbers=None):
+    # Record every call of func under `stage`; there is one call per page, in page order
+    if profiler is None:
+        return func
+    pages = count() if page_numbers is None else iter(page_numbers)
+
+    def measured(*args):
+        with profiler.measure(stage, next(pages)):
+            return func(*args)
+    return measured
+
+def default_cache_dir():
+    # Per-user cache directory, unless KREATOR_CACHE_DIR points somewhere else
+    if os.environ.get(CACHE_DIR_ENV):
+        return os.environ[CACHE_DIR_ENV]
+    base = os.environ.get("LOCALAPPDATA") or os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "kreator-podsumowan")
+
+def processing_key(dpi=BASE_DPI, clip=False, padding=CLIP_PADDING, fast_deskew=False, extract_scans=False):
+    # Everything besides the page content that changes the resulting crop
+    import json
+
+    settings = {
+        "version": CACHE_VERSION,
+        "crop_box": NAME_CROP_BOX,
+        "dpi": dpi,
+        "hough_threshold": HOUGH_THRESHOLD,
+        "enhance": [CONTRAST_FACTOR, BRIGHTNESS_FACTOR, CLAHE_CLIP_LIMIT, CLAHE_TILE_GRID],
+    }
+    if extract_scans:
+        # Scan pages take the extraction path, other pages the one chosen below
+        settings["extract_scans"] = SKEW_DPI
+    if fast_deskew:
+        settings["fast_deskew"] = SKEW_DPI
+    elif clip:
+        settings["clip_padding"] = padding
+    return json.dumps(settings, sort_keys=True)
+
+def page_fingerprint(page):
+    import hashlib
+    import re
+
+    # Hash what the page is drawn from: its page boxes and rotation, content stream, the raw
+    # bytes of its images and form XObjects, and its annotations and form fields. Object numbers
+    # are left out so the hash survives pages being appended or the file being rewritten
+    doc = page.parent
+    digest = hashlib.sha256()
+    digest.update(repr((tuple(page.mediabox), tuple(page.cropbox), tuple(page.transformation_matrix), page.rotation)).encode())
+    digest.update(page.read_contents())
+    for image in page.get_images(full=True):
+        xref, smask, name = image[0], image[1], image[7]
+        digest.update(name.encode())
+        digest.update(doc.xref_stream_raw(xref) or b"")
+        if smask:
+            digest.update(doc.xref_stream_raw(smask) or b"")
+    for xobject in page.get_xobjects():
+        digest.update(xobject[1].encode())
+        digest.update(doc.xref_stream_raw(xobject[0]) or b"")
+    for font in page.get_fonts(full=True):
+        digest.update(repr(font[1:6]).encode())
+    # Annotations are rendered too: hash their definition and normal appearance stream
+    annot_xrefs = [annot.xref for annot in page.annots()] + [widget.xref for widget in page.widgets()]
+    for xref in annot_xrefs:
+        digest.update(re.sub(r"\d+ \d+ R", "R", doc.xref_object(xref, compressed=True)).encode())
+        kind, value = doc.xref_get_key(xref, "AP/N")
+        if kind == "xref":
+            digest.update(doc.xref_stream_raw(int(value.split()[0])) or b"")
+        else:
+            digest.update(value.encode())
+    return digest.hexdigest()
+
+class CropCache:
+    # On-disk store of enhanced name crops keyed by page content and processing settings,
+    # trimmed back to max_bytes by removing the least recently used crops
+
+    def __init__(self, cache_dir, max_bytes=CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def key(self, fingerprint, settings):
+        import hashlib
+
+        return hashlib.sha256((fingerprint + settings).encode()).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".png")
+
+    def load(self, key):
+        from PIL import Image
+
+        path = self.path(key)
+        try:
+            with Image.open(path) as image:
+                image.load()
+            # The modification time doubles as the last use time for trimming
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return image
+
+    def store(self, key, image):
+        # Write to a temporary name first so other runs never see half-written files
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            image.save(tmp_path, format='PNG')
+            os.replace(tmp_path, path)
+        except OSError:
+            # A cache that cannot be written only costs speed
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def iter_crops(self, pdf_path, settings, process, cancel=None):
+        import fitz  # PyMuPDF
+
+        # Yield the crops in page order, taking cached ones from disk and passing only the
+        # missing page numbers to process(page_numbers)
+        keys = []
+        with fitz.open(pdf_path) as doc:
+            for page_num in range(len(doc)):
+                # Fingerprinting a long document takes a while, so it can be cancelled as well
+                if cancel is not None and cancel.is_set():
+                    raise ConversionCancelled()
+                keys.append(self.key(page_fingerprint(doc.load_page(page_num)), settings))
+        # Only check which crops are cached here; they are loaded one at a time as they are yielded
+        missing = [page_num for page_num, key in enumerate(keys) if not os.path.exists(self.path(key))]
+        pending = deque(missing)
+        processed = process(missing) if missing else iter(())
+        try:
+            for page_num, key in enumerate(keys):
+                if pending and pending[0] == page_num:
+                    pending.popleft()
+                    image = next(processed)
+                    self.store(key, image)
+                else:
+                    image = self.load(key)
+                    if image is None:
+                        # Removed or damaged since it was looked up. Only one pipeline may use
+                        # PyMuPDF at a time, so stop the running one and restart it from this page
+                        if hasattr(processed, "close"):
+                            processed.close()
+                        processed = process([page_num] + list(pending))
+                        image = next(processed)
+                        self.store(key, image)
+                yield image
+        finally:
+            if hasattr(processed, "close"):
+                processed.close()
+
+    def iter_files(self):
+        import re
+
+        # Only files this cache wrote: <2 hex>/<64 hex>.png crops and their temporary files.
+        # Anything else in the directory belongs to somebody else and is never touched
+        crop_name = re.compile(r"([0-9a-f]{64})\.png(\.\d+\.\d+\.tmp)?")
+        try:
+            subdirs = os.listdir(self.cache_dir)
+        except OSError:
+            return
+        for subdir in subdirs:
+            if not re.fullmatch(r"[0-9a-f]{2}", subdir) or not os.path.isdir(os.path.join(self.cache_dir, subdir)):
+                continue
+            for name in os.listdir(os.path.join(self.cache_dir, subdir)):
+                match = crop_name.fullmatch(name)
+                if match and match.group(1)[:2] == subdir:
+                    yield os.path.join(self.cache_dir, subdir, name), match.group(2) is not None
+
+    def trim(self):
+        # Remove the least recently used crops until the cache fits in max_bytes, and
+        # temporary files that interrupted runs left behind
+        entries = []
+        total = 0
+        now = time.time()
+        for path, temporary in self.iter_files():
+            try:
+                stat = os.stat(path)
+                if temporary and now - stat.st_mtime > CACHE_TMP_MAX_AGE:
+                    os.remove(path)
+                    continue
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        entries.sort()
+        for mtime, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
 
 def cancel():
+    # Stop a running conversion after the current page
+    if conversion_cancel is not None:
+        conversion_cancel.set()
+        label_file.config(text="Anulowanie...")
+        return
+
     label_file.config(text="Nie wybrano jeszcze pliku.")
     global input_file_path
     input_file_path = ""
@@ -89,29 +530,246 @@ def on_enter(event):
 def on_leave(event):
     label_browse.config(fg="blue", font=("Helvetica", 12))
 
-def pdf_to_images(pdf_path):
+def count_pages(pdf_path):
+    import fitz  # PyMuPDF
+
+    with fitz.open(pdf_path) as doc:
+        return len(doc)
+
+def pdf_to_images(pdf_path, dpi=BASE_DPI, clip=None, padding=0):
+    return list(iter_pdf_images(pdf_path, dpi, clip, padding))
+
+def iter_pdf_images(pdf_path, dpi=BASE_DPI, clip=None, padding=0):
+    return iter_pdf_pages(pdf_path, lambda page: render_page(page, dpi, clip, padding))
+
+def iter_pdf_pages(pdf_path, render, page_numbers=None):
+    import fitz  # PyMuPDF
+
+    # Yield the rendered pages one by one so only the pages in flight are kept in memory
     doc = fitz.open(pdf_path)
-    images = []
-    for page_num in range(len(doc)):
-        page = doc.load_page(page_num)
-        pix = page.get_pixmap()
-        img = Image.open(io.BytesIO(pix.tobytes()))
-        images.append(img)
-    return images
+    try:
+        if page_numbers is None:
+            page_numbers = range(len(doc))
+        for page_num in page_numbers:
+            page = doc.load_page(page_num)
+            image = render(page)
+            # Every page's scan is decoded for that page only, so empty MuPDF's store of
+            # decoded images instead of letting it grow with the document
+            fitz.TOOLS.store_shrink(100)
+            yield image
+    finally:
+        doc.close()
+
+def name_crop_box(dpi=BASE_DPI):
+    # Crop box in pixels of the rendered page
+    return scale_box(NAME_CROP_BOX, dpi)
+
+def iter_name_crops(pdf_path, dpi=BASE_DPI, clip=False, padding=CLIP_PADDING, window=PIPELINE_WINDOW, fast_deskew=False, profiler=None, page_numbers=None, extract_scans=False):
+    # Chain the processing stages as generators so pages are handled one at a time
+    enhance = profiled(profiler, "enhance", enhance_image, page_numbers)
+    if fast_deskew or extract_scans or clip:
+        # Deskewing the name region is cheap enough to run in the render stage
+        stage = "extract_scans" if extract_scans else "fast_deskew" if fast_deskew else "clip"
+        deskew = profiled(profiler, stage, lambda page: extract_crop(page, dpi, clip, padding, fast_deskew, extract_scans), page_numbers)
+        cropped_names = prefetch(iter_pdf_pages(pdf_path, deskew, page_numbers), window)
+        return (enhance(img) for img in cropped_names)
+    render = profiled(profiler, "render", lambda page: render_page(page, dpi), page_numbers)
+    deskew = profiled(profiler, "deskew", correct_skew, page_numbers)
+    crop = profiled(profiler, "crop", crop_image, page_numbers)
+    crop_box = name_crop_box(dpi)
+    images = prefetch(iter_pdf_pages(pdf_path, render, page_numbers), window)
+    corrected_images = (deskew(img) for img in images)
+    cropped_names = (crop(img, crop_box) for img in corrected_images)
+    return (enhance(img) for img in cropped_names)
+
+def extract_crop(page, dpi=BASE_DPI, clip=False, padding=CLIP_PADDING, fast_deskew=False, extract_scans=False):
+    # Run the render -> deskew -> crop chain for a single page
+    if extract_scans:
+        crop = scan_name_crop(page, dpi)
+        if crop is not None:
+            return crop
+    if fast_deskew:
+        return fast_deskew_name(page, dpi)
+    if clip:
+        return fast_deskew_name(page, dpi, padding=padding)
+    image = render_page(page, dpi)
+    image = correct_skew(image)
+    return crop_image(image, name_crop_box(dpi))
+
+def process_page_chunk(pdf_path, page_numbers, dpi=BASE_DPI, clip=False, padding=CLIP_PADDING, fast_deskew=False, extract_scans=False):
+    import fitz  # PyMuPDF
+
+    # Worker entry point: each process opens the PDF itself and returns only the small crops,
+    # enhanced together as one batch
+    doc = fitz.open(pdf_path)
+    try:
+        crops = []
+        for page_num in page_numbers:
+            crops.append(extract_crop(doc.load_page(page_num), dpi, clip, padding, fast_deskew, extract_scans))
+            fitz.TOOLS.store_shrink(100)
+    finally:
+        doc.close()
+    return enhance_images(crops)
+
+def iter_name_crops_parallel(pdf_path, workers, chunk_size=CHUNK_SIZE, dpi=BASE_DPI, clip=False, padding=CLIP_PADDING, fast_deskew=False, page_numbers=None, extract_scans=False, cancel=None):
+    from concurrent.futures import ProcessPoolExecutor, wait
+    from concurrent.futures.process import BrokenProcessPool
+
+    # Spread chunks of pages over worker processes and yield the crops in page order
+    if page_numbers is None:
+        page_numbers = range(count_pages(pdf_path))
+    page_numbers = list(page_numbers)
+    chunks = [page_numbers[start:start + chunk_size] for start in range(0, len(page_numbers), chunk_size)]
+
+    try:
+        executor = ProcessPoolExecutor(max_workers=workers)
+    except (OSError, NotImplementedError, ImportError):
+        # Process pools are unavailable on this platform, run everything in this process
+        yield from iter_name_crops(pdf_path, dpi, clip, padding, fast_deskew=fast_deskew, page_numbers=page_numbers, extract_scans=extract_scans)
+        return
+
+    pending = deque()
+    next_chunk = 0
+    next_result = 0
+    closed = False
+    try:
+        # Keep a couple of chunks queued per worker so the pool never idles, but no more
+        while next_chunk < len(chunks) or pending:
+            while next_chunk < len(chunks) and len(pending) < workers * 2:
+                pending.append(executor.submit(process_page_chunk, pdf_path, chunks[next_chunk], dpi, clip, padding, fast_deskew, extract_scans))
+                next_chunk += 1
+            future = pending.popleft()
+            # A chunk takes a while, so watch for a cancel while waiting for it
+            while cancel is not None and not wait([future], timeout=0.1).done:
+                if cancel.is_set():
+                    raise ConversionCancelled()
+            yield from future.result()
+            next_result += 1
+    except (GeneratorExit, ConversionCancelled):
+        closed = True
+        raise
+    except (BrokenProcessPool, OSError):
+        # A worker died or could not be started, finish the remaining pages serially
+        for chunk in chunks[next_result:]:
+            yield from process_page_chunk(pdf_path, chunk, dpi, clip, padding, fast_deskew, extract_scans)
+    finally:
+        if closed:
+            # The conversion was cancelled or stopped early, so stop the running chunks
+            # instead of waiting for them; the executor has no public way to do that
+            processes = list((executor._processes or {}).values())
+            executor.shutdown(wait=False, cancel_futures=True)
+            for process in processes:
+                process.terminate()
+                process.join()
+        else:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+def prefetch(items, window=PIPELINE_WINDOW):
+    # Produce items on a background thread, keeping at most `window` of them buffered
+    if window <= 1:
+        yield from items
+        return
+
+    buffer = queue.Queue(maxsize=window)
+    stop = threading.Event()
+    done = object()
+
+    def put(item):
+        # Wait for free space, but give up once the consumer has gone away
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not put((item, None)):
+                    break
+            else:
+                put((done, None))
+        except Exception as e:
+            put((done, e))
+        finally:
+            if hasattr(items, "close"):
+                items.close()
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            item, error = buffer.get()
+            if error is not None:
+                raise error
+            if item is done:
+                break
+            yield item
+    finally:
+        stop.set()
+        producer.join()
+
+def render_page(page, dpi=BASE_DPI, clip=None, padding=0):
+    import fitz  # PyMuPDF
+
+    # Render the whole page, or only the padded clip rectangle (given in PDF points)
+    if clip is not None:
+        clip = fitz.Rect(clip[0] - padding, clip[1] - padding, clip[2] + padding, clip[3] + padding)
+    return pixmap_to_image(render_pixmap(page, dpi, clip))
+
+def render_pixmap(page, dpi=BASE_DPI, clip=None):
+    import fitz  # PyMuPDF
+
+    zoom = dpi / BASE_DPI
+    return page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), clip=clip, colorspace=fitz.csRGB, alpha=False)
+
+def pixmap_to_image(pix):
+    from PIL import Image
+
+    # Wrap the raw RGB samples directly, skipping the PNG encode/decode round-trip
+    return Image.frombuffer("RGB", (pix.width, pix.height), pix.samples, "raw", "RGB", pix.stride, 1)
+
+def scale_box(box, dpi):
+    # Convert a box given in 72 DPI pixels to pixels at the requested resolution
+    zoom = dpi / BASE_DPI
+    return tuple(int(round(v * zoom)) for v in box)
 
 def crop_image(image, crop_box):
     return image.crop(crop_box)
 
 def correct_skew(image):
+    import cv2
+    import numpy as np
+    from PIL import Image
+
     # Convert PIL Image to NumPy array
     image_np = np.array(image)
 
     # Convert to grayscale
     gray = cv2.cvtColor(image_np, cv2.COLOR_RGB2GRAY)
+    median_angle = estimate_skew_angle(gray)
+
+    # Rotate the image to correct skew
+    (h, w) = image_np.shape[:2]
+    center = (w // 2, h // 2)
+    M = cv2.getRotationMatrix2D(center, median_angle, 1.0)
+    rotated = cv2.warpAffine(image_np, M, (w, h), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
+    
+    # Convert the corrected NumPy array back to a PIL Image
+    corrected_image = Image.fromarray(cv2.cvtColor(rotated, cv2.COLOR_BGR2RGB))
+    
+    return corrected_image
+
+def estimate_skew_angle(gray, threshold=HOUGH_THRESHOLD):
+    import cv2
+    import numpy as np
+
     # Apply edge detection
     edges = cv2.Canny(gray, 50, 150, apertureSize=3)
     # Use the Hough Line Transform to detect lines in the image
-    lines = cv2.HoughLines(edges, 1, np.pi / 180, 200)
+    lines = cv2.HoughLines(edges, 1, np.pi / 180, threshold)
     
     # Calculate the angle of the lines
     angles = []
@@ -122,32 +780,284 @@ def correct_skew(image):
     
     # Compute the median angle of the detected lines
     if len(angles) > 0:
-        median_angle = np.median(angles)
+        return np.median(angles)
+    return 0  # If no lines are detected, assume no rotation is needed
+
+def estimate_page_skew(page, skew_dpi=SKEW_DPI):
+    import cv2
+    import numpy as np
+
+    # Estimate the angle on a cheap low-resolution render
+    gray = cv2.cvtColor(np.array(render_page(page, skew_dpi)), cv2.COLOR_RGB2GRAY)
+    return estimate_skew_angle(gray, hough_threshold(skew_dpi))
+
+def hough_threshold(dpi):
+    # Lines are shorter at lower resolutions, so they need fewer votes
+    return max(1, round(HOUGH_THRESHOLD * dpi / BASE_DPI))
+
+def skew_source_rect(crop_box, angle, center, margin=4):
+    import cv2
+    import numpy as np
+
+    # Map the crop box back through the rotation to find the source pixels it is sampled from
+    M = cv2.getRotationMatrix2D(center, angle, 1.0)
+    inverse = cv2.invertAffineTransform(M)
+    x0, y0, x1, y1 = crop_box
+    corners = np.array([[x0, y0, 1], [x1, y0, 1], [x0, y1, 1], [x1, y1, 1]], dtype=np.float64)
+    points = corners @ inverse.T
+    # Widen by a few pixels for the cubic interpolation kernel
+    return (int(np.floor(points[:, 0].min())) - margin, int(np.floor(points[:, 1].min())) - margin,
+            int(np.ceil(points[:, 0].max())) + margin, int(np.ceil(points[:, 1].max())) + margin)
+
+def deskew_crop(image, angle, crop_box, center, origin=(0, 0)):
+    import cv2
+    import numpy as np
+    from PIL import Image
+
+    # Same rotation as correct_skew, but only the pixels inside crop_box are computed.
+    # crop_box and center are in page pixels, origin is the page position of the image's top-left pixel
+    image_np = np.array(image)
+    M = cv2.getRotationMatrix2D((center[0] - origin[0], center[1] - origin[1]), angle, 1.0)
+    M[0, 2] -= crop_box[0] - origin[0]
+    M[1, 2] -= crop_box[1] - origin[1]
+    size = (crop_box[2] - crop_box[0], crop_box[3] - crop_box[1])
+    rotated = cv2.warpAffine(image_np, M, size, flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
+    return Image.fromarray(cv2.cvtColor(rotated, cv2.COLOR_BGR2RGB))
+
+def fast_deskew_name(page, dpi=BASE_DPI, skew_dpi=SKEW_DPI, padding=None):
+    import fitz  # PyMuPDF
+
+    # Deskew around the page center like correct_skew, rendering and warping only what the crop needs.
+    # A clipped render is not pixel-identical to the same region of a full-page render (MuPDF
+    # picks its own scan subsampling for it), so the crops differ slightly from correct_skew + crop_image.
+    # Clip mode passes a padding and renders the fixed padded name region instead; the angle still
+    # comes from the whole page, since the clip is too small for the Hough transform to find lines
+    angle = estimate_page_skew(page, skew_dpi)
+    zoom = dpi / BASE_DPI
+    page_rect = (page.rect * fitz.Matrix(zoom, zoom)).irect
+    center = (page_rect.width // 2, page_rect.height // 2)
+    crop_box = scale_box(NAME_CROP_BOX, dpi)
+    if padding is None:
+        source = fitz.Rect(skew_source_rect(crop_box, angle, center)) / zoom
     else:
-        median_angle = 0  # If no lines are detected, assume no rotation is needed
+        source = fitz.Rect(NAME_CROP_BOX) + (-padding, -padding, padding, padding)
+    pix = render_pixmap(page, dpi, source)
+    return deskew_crop(pixmap_to_image(pix), angle, crop_box, center, (pix.x, pix.y))
 
-    # Rotate the image to correct skew
-    (h, w) = image_np.shape[:2]
-    center = (w // 2, h // 2)
-    M = cv2.getRotationMatrix2D(center, median_angle, 1.0)
-    rotated = cv2.warpAffine(image_np, M, (w, h), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
-    
-    # Convert the corrected NumPy array back to a PIL Image
-    corrected_image = Image.fromarray(cv2.cvtColor(rotated, cv2.COLOR_BGR2RGB))
-    
-    return corrected_image
+def check_fast_deskew(pdf_path, dpi=BASE_DPI, skew_dpi=SKEW_DPI, tolerance=SKEW_TOLERANCE):
+    import cv2
+    import fitz  # PyMuPDF
+    import numpy as np
+
+    # Compare the fast angle estimate with the full-resolution one used by correct_skew;
+    # returns (page number, full angle, fast angle) for every page outside the tolerance
+    outliers = []
+    with fitz.open(pdf_path) as doc:
+        for page_num in range(len(doc)):
+            page = doc.load_page(page_num)
+            gray = cv2.cvtColor(np.array(render_page(page, dpi)), cv2.COLOR_RGB2GRAY)
+            reference = estimate_skew_angle(gray)
+            fast = estimate_page_skew(page, skew_dpi)
+            if round(abs(reference - fast), 3) > tolerance:
+                outliers.append((page_num, float(reference), float(fast)))
+    return outliers
+
+def scan_image(page):
+    import fitz  # PyMuPDF
+
+    # The (xref, page rectangle) of the one upright image a scanned page consists of, or None.
+    # The content stream is read directly, since MuPDF's image placement queries decode the
+    # image; anything besides placing that image (text, paths, clipping) means rendering
+    images = page.get_images(full=True)
+    if page.rotation != 0 or len(images) != 1:
+        return None
+    xref, smask, width, height, _, _, _, name, _, referencer = images[0]
+    doc = page.parent
+    if smask or referencer or doc.xref_get_key(xref, "Decode")[0] != "null" or doc.xref_get_key(xref, "ImageMask")[1] == "true":
+        return None
+
+    operands = []
+    states = [fitz.Identity]
+    placements = []
+    for token in page.read_contents().split():
+        token = token.decode("latin-1")
+        if token == "q":
+            states.append(states[-1])
+        elif token == "Q" and len(states) > 1:
+            states.pop()
+        elif token == "cm" and len(operands) == 6:
+            states[-1] = fitz.Matrix(*operands) * states[-1]
+        elif token == "Do" and operands == ["/" + name]:
+            placements.append(states[-1])
+        elif token.startswith("/") and not operands:
+            operands = [token]
+            continue
+        else:
+            try:
+                operands.append(float(token))
+            except ValueError:
+                return None
+            continue
+        operands = []
+    if len(placements) != 1:
+        return None
+    matrix = placements[0]
+    if abs(matrix.b) > 1e-3 or abs(matrix.c) > 1e-3 or matrix.a <= 0 or matrix.d <= 0:
+        return None
+    return xref, fitz.Rect(0, 0, 1, 1).transform(matrix * page.transformation_matrix)
+
+def decode_scan(doc, xref, size):
+    import cv2
+    import fitz  # PyMuPDF
+    import numpy as np
+    from PIL import Image
+
+    # Decode the scan to grayscale at no less than `size` pixels (and not much more).
+    # JPEGs are decoded at a reduced DCT scale, other formats (JBIG2, CCITT, Flate) by MuPDF
+    if doc.xref_get_key(xref, "Filter")[1] in JPEG_FILTERS:
+        image = Image.open(io.BytesIO(doc.xref_stream_raw(xref)))
+        image.draft("L", size)
+        if image.mode == "RGB":
+            image = image.convert("L")
+        elif image.mode != "L":
+            # CMYK scans are left to MuPDF's color handling
+            return None
+        return np.asarray(image)
+
+    pix = fitz.Pixmap(doc, xref)
+    if pix.alpha or pix.n != 1:
+        pix = fitz.Pixmap(fitz.csGRAY, pix)
+    gray = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.stride)[:, :pix.width]
+    if gray.shape[1] >= 2 * size[0] and gray.shape[0] >= 2 * size[1]:
+        gray = cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+    return gray
+
+def scan_name_crop(page, dpi=BASE_DPI, skew_dpi=SKEW_DPI):
+    import cv2
+    import fitz  # PyMuPDF
+    import numpy as np
+    from PIL import Image
+
+    # Fast path for scanned pages: cut the deskewed name crop straight out of the embedded
+    # image instead of rendering the page. Returns None for pages that are not simple scans
+    placement = scan_image(page)
+    if placement is None:
+        return None
+    xref, rect = placement
+    doc = page.parent
+
+    def size_at(resolution):
+        return (max(1, round(rect.width * resolution / BASE_DPI)), max(1, round(rect.height * resolution / BASE_DPI)))
+
+    # Decode once, and estimate the angle on a low-resolution copy like estimate_page_skew does
+    source = decode_scan(doc, xref, size_at(dpi))
+    if source is None:
+        return None
+    small = cv2.resize(source, size_at(skew_dpi), interpolation=cv2.INTER_AREA)
+    angle = estimate_skew_angle(small, hough_threshold(skew_dpi))
+
+    zoom = dpi / BASE_DPI
+    page_rect = (page.rect * fitz.Matrix(zoom, zoom)).irect
+    center = (page_rect.width // 2, page_rect.height // 2)
+    crop_box = scale_box(NAME_CROP_BOX, dpi)
+
+    # One warp maps each crop pixel to the deskewed page, back through the rotation of
+    # correct_skew, and into the decoded scan (scaling around pixel centers)
+    scale_x = source.shape[1] / (rect.width * zoom)
+    scale_y = source.shape[0] / (rect.height * zoom)
+    to_scan = np.array([[scale_x, 0, 0.5 * scale_x - 0.5 - rect.x0 * zoom * scale_x],
+                        [0, scale_y, 0.5 * scale_y - 0.5 - rect.y0 * zoom * scale_y],
+                        [0, 0, 1]])
+    rotation = cv2.invertAffineTransform(cv2.getRotationMatrix2D(center, angle, 1.0))
+    to_page = np.vstack([rotation, [0, 0, 1]])
+    from_crop = np.array([[1, 0, crop_box[0]], [0, 1, crop_box[1]], [0, 0, 1]])
+    M = (to_scan @ to_page @ from_crop)[:2]
+    size = (crop_box[2] - crop_box[0], crop_box[3] - crop_box[1])
+    crop = cv2.warpAffine(source, M, size, flags=cv2.INTER_CUBIC | cv2.WARP_INVERSE_MAP, borderMode=cv2.BORDER_REPLICATE)
+    return Image.fromarray(crop)
 
 def enhance_image(image):
+    return enhance_images([image])[0]
+
+def enhance_images(images):
+    import cv2
+    import numpy as np
+    from PIL import Image
+
+    # Same result as enhance_image_reference, but contrast, brightness and normalization are
+    # fused into one lookup table per image. Crops of equal size are processed as one stack
+    if not images:
+        return []
+    sizes = {image.size for image in images}
+    if len(sizes) > 1:
+        enhanced = [None] * len(images)
+        for size in sizes:
+            indices = [i for i, image in enumerate(images) if image.size == size]
+            for i, image in zip(indices, enhance_images([images[i] for i in indices])):
+                enhanced[i] = image
+        return enhanced
+
+    gray = np.stack([np.asarray(image if image.mode == 'L' else image.convert('L')) for image in images])
+    flat = gray.reshape(len(images), -1)
+
+    # Per-image histograms from a single bincount, each image offset into its own 256 bins
+    offsets = np.arange(len(images), dtype=np.intp)[:, None] * 256
+    hist = np.bincount((flat + offsets).ravel(), minlength=256 * len(images)).reshape(len(images), 256)
+
+    # Mean the same way as ImageEnhance.Contrast (ImageStat mean, rounded half up)
+    means = (hist @ np.arange(256) / flat.shape[1] + 0.5).astype(np.intp)
+    luts = enhance_tables()[means]
+    lows = flat.min(axis=1)
+    highs = flat.max(axis=1)
+
+    clahe = shared_clahe()
+    enhanced = []
+    for lut, low, high, image_gray in zip(luts, lows, highs, gray):
+        # The table is monotonic, so the image's min and max map to the enhanced min and max.
+        # Levels outside them never occur, so clipping lets cv2.normalize see the same range
+        lut = cv2.normalize(np.clip(lut, lut[low], lut[high]), None, 0, 255, cv2.NORM_MINMAX)
+        enhanced.append(Image.fromarray(clahe.apply(cv2.LUT(image_gray, lut))))
+    return enhanced
+
+@lru_cache(maxsize=None)
+def enhance_tables():
+    import numpy as np
+
+    # Row m maps every gray level through ImageEnhance.Contrast (for an image with mean m)
+    # and then ImageEnhance.Brightness, with the float32 blend-and-truncate arithmetic PIL uses
+    levels = np.arange(256, dtype=np.float32)
+    means = levels[:, None]
+    contrast = means + np.float32(CONTRAST_FACTOR) * (levels - means)
+    contrast = np.clip(contrast, 0, 255).astype(np.uint8).astype(np.float32)
+    brightness = np.float32(BRIGHTNESS_FACTOR) * contrast
+    return np.clip(brightness, 0, 255).astype(np.uint8)
+
+def shared_clahe():
+    import cv2
+
+    # One CLAHE object per thread; OpenCV keeps scratch buffers in it, so it is not shared
+    clahe = getattr(clahe_local, "clahe", None)
+    if clahe is None:
+        clahe = cv2.createCLAHE(clipLimit=CLAHE_CLIP_LIMIT, tileGridSize=CLAHE_TILE_GRID)
+        clahe_local.clahe = clahe
+    return clahe
+
+def enhance_image_reference(image):
+    # The original PIL/OpenCV chain, kept to verify enhance_images against
+    import cv2
+    import numpy as np
+    from PIL import Image, ImageEnhance
+
     # Convert image to grayscale
     image = image.convert('L')
     
     # Enhance contrast
     enhancer = ImageEnhance.Contrast(image)
-    image = enhancer.enhance(3)  # Increase contrast by a factor of 2
+    image = enhancer.enhance(CONTRAST_FACTOR)  # Increase contrast
     
     # Enhance brightness
     enhancer = ImageEnhance.Brightness(image)
-    image = enhancer.enhance(0.6)  # Decrease brightness by a factor of 0.8
+    image = enhancer.enhance(BRIGHTNESS_FACTOR)  # Decrease brightness
     
     # Convert PIL Image to NumPy array for further processing
     image_np = np.array(image)
@@ -156,7 +1066,7 @@ def enhance_image(image):
     image_np = cv2.normalize(image_np, None, 0, 255, cv2.NORM_MINMAX)
     
     # Apply CLAHE (Contrast Limited Adaptive Histogram Equalization) to enhance the text
-    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+    clahe = cv2.createCLAHE(clipLimit=CLAHE_CLIP_LIMIT, tileGridSize=CLAHE_TILE_GRID)
     image_np = clahe.apply(image_np)
     
     # Convert back to PIL Image
@@ -164,174 +1074,352 @@ def enhance_image(image):
     
     return enhanced_image
 
+def check_enhance(pdf_path, dpi=BASE_DPI, tolerance=ENHANCE_TOLERANCE):
+    import numpy as np
+
+    # Compare enhance_images with enhance_image_reference on every page's crop;
+    # returns (page number, largest difference) for every page outside the tolerance
+    crops = list(iter_pdf_pages(pdf_path, lambda page: extract_crop(page, dpi)))
+    outliers = []
+    for page_num, (crop, enhanced) in enumerate(zip(crops, enhance_images(crops))):
+        reference = np.asarray(enhance_image_reference(crop), dtype=np.int16)
+        difference = int(np.abs(np.asarray(enhanced, dtype=np.int16) - reference).max())
+        if difference > tolerance:
+            outliers.append((page_num, difference))
+    return outliers
+
 def get_image_size(image):
     # Return the width and height of the image in pixels
     return image.width, image.height
 
-def create_table_structure(output_path):
-    wb = Workbook()
-    ws = wb.active
+def cell_image_size(image, cell_height=None):
+    # Size the crop is shown at in the sheet; crops taller than cell_height are scaled down to it
+    width, height = get_image_size(image)
+    if cell_height is None or height <= cell_height:
+        return width, height
+    return max(1, round(width * cell_height / height)), cell_height
+
+def encode_image(image, encoding="gray", cell_height=None):
+    import cv2
+    import numpy as np
+    from PIL import Image
+
+    # Scale the crop down to its cell, so the file holds no pixels Excel never shows
+    size = cell_image_size(image, cell_height)
+    if size != get_image_size(image):
+        image = image.resize(size, Image.LANCZOS)
+    if image.mode != "L":
+        image = image.convert("L")
+
+    # Text crops survive a much smaller PNG well: a few gray levels, or black and white
+    options = {}
+    if encoding == "palette":
+        levels = PALETTE_COLORS - 1
+        image = image.point([round(v * levels / 255) for v in range(256)])
+        image.putpalette([round(i * 255 / levels) for i in range(PALETTE_COLORS) for _ in range(3)])
+        options["bits"] = next(bits for bits in (1, 2, 4, 8) if PALETTE_COLORS <= 2 ** bits)
+    elif encoding == "bilevel":
+        _, binary = cv2.threshold(np.asarray(image), 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        image = Image.fromarray(binary).convert("1")
+    elif encoding != "gray":
+        raise ValueError("Unknown image encoding: " + str(encoding))
+
+    # Convert the PIL image to a PNG byte stream
+    img_byte_arr = io.BytesIO()
+    image.save(img_byte_arr, format='PNG', **options)
+    img_byte_arr.seek(0)
+    return img_byte_arr
+
+def encode_ahead(images, encode, workers=ENCODE_WORKERS):
+    from concurrent.futures import ThreadPoolExecutor
+
+    # Yield (image, encoded) pairs in order, with up to two images per thread being encoded
+    # ahead of the writer; PIL releases the GIL while compressing
+    if workers is None or workers <= 1:
+        for image in images:
+            yield image, encode(image)
+        return
+
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        try:
+            for image in images:
+                pending.append((image, executor.submit(encode, image)))
+                if len(pending) >= workers * 2:
+                    image, future = pending.popleft()
+                    yield image, future.result()
+            while pending:
+                image, future = pending.popleft()
+                yield image, future.result()
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+def insert_images_to_excel(images, output_path, profiler=None, encoding="gray", cell_height=None, encode_workers=ENCODE_WORKERS):
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.drawing.image import Image as OpenpyxlImage
+    from openpyxl.styles import Border, Side, Alignment, Font
+
+    if cell_height is not None and cell_height < 1:
+        raise ValueError("cell_height must be a positive number of pixels")
 
-    # Define a border style for the cells
+    # Build the whole table in one pass with a streaming (write-only) workbook
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+
+    # Define the styles once and share them between all cells
     thin_border = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'), bottom=Side(style='thin'))
     thick_border = Border(left=Side(style='medium'), right=Side(style='medium'), top=Side(style='medium'), bottom=Side(style='medium'))
+    center = Alignment(horizontal='center', vertical='center')
+    header_font = Font(name='Arial', size=14, bold=True)
+    bold_font = Font(name='Arial', size=12, bold=True)
+    regular_font = Font(name='Arial', size=12)
 
-    # Add table header
-    ws.merge_cells('A1:C1')
-    header_cell = ws.cell(row=1, column=1, value="Szkoła")
-    header_cell.alignment = Alignment(horizontal='center', vertical='center')
-    header_cell.font = Font(name='Arial', size=14, bold=True)
-    header_cell.border = thin_border
+    def styled_cell(value=None, border=None, alignment=None, font=None):
+        cell = WriteOnlyCell(ws, value=value)
+        if border is not None:
+            cell.border = border
+        if alignment is not None:
+            cell.alignment = alignment
+        if font is not None:
+            cell.font = font
+        return cell
 
-    # Add border around merged cells
-    for col in range(1, 4):
-        ws.cell(row=1, column=col).border = thin_border
+    # Columns have to be sized before the first row is written, so look at the first image
+    images = iter(images)
+    first = next(images, None)
+    if first is not None:
+        img_width, img_height = cell_image_size(first, cell_height)
+        ws.column_dimensions['B'].width = img_width / 7.18
+        images = chain([first], images)
+
+    # Add table header
+    ws.merged_cells.add('A1:C1')
+    ws.append([styled_cell("Szkoła", thin_border, center, header_font), styled_cell(border=thin_border), styled_cell(border=thin_border)])
 
     # Add column headers
     headers = ["Numer", "Klasa", "Kwota"]
-    for col_num, header in enumerate(headers, start=1):
-        cell = ws.cell(row=2, column=col_num, value=header)
-        cell.alignment = Alignment(horizontal='center', vertical='center')
-        cell.font = Font(name='Arial', size=12, bold=True)
-        cell.border = thin_border
+    ws.append([styled_cell(header, thin_border, center, bold_font) for header in headers])
 
-    # Save the workbook
-    wb.save(output_path)
+    encode = profiled(profiler, "encode", lambda img: encode_image(img, encoding, cell_height))
 
-def insert_images_to_excel(images, output_path):
-    wb = load_workbook(output_path)
-    ws = wb.active
+    start_row = 3
+    image_count = 0
+    try:
+        # Convert the PIL images to byte streams ahead of the writer
+        for idx, (img, img_byte_arr) in enumerate(encode_ahead(images, encode, encode_workers), start=start_row):
+            image_count += 1
 
-    # Define a border style for the cells
-    thin_border = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'), bottom=Side(style='thin'))
-    thick_border = Border(left=Side(style='medium'), right=Side(style='medium'), top=Side(style='medium'), bottom=Side(style='medium'))
+            # Add the image to the spreadsheet in the second column
+            openpyxl_img = OpenpyxlImage(img_byte_arr)
+            ws.add_image(openpyxl_img, f'B{idx}')
 
-    start_row = 3
-    for idx, img in enumerate(images, start=start_row):
-        # Add number to the first column
-        num_cell = ws.cell(row=idx, column=1, value=idx - start_row + 1)
-        num_cell.border = thin_border
-        num_cell.alignment = Alignment(horizontal='center', vertical='center')
-        num_cell.font = Font(name='Arial', size=12)
-        
-        # Convert the PIL image to a byte stream
-        img_byte_arr = io.BytesIO()
-        img.save(img_byte_arr, format='PNG')
-        img_byte_arr.seek(0)
-
-        # Load the image into an openpyxl Image object from the byte stream
-        openpyxl_img = OpenpyxlImage(img_byte_arr)
-
-        # Calculate cell identifier
-        col_letter = get_column_letter(2)
-        cell = f'{col_letter}{idx}'
-
-        # Add the image to the spreadsheet in the second column with offsets
-        openpyxl_img.anchor = f'{col_letter}{idx}'
-
-        # Add the image to the spreadsheet in the second column
-        ws.add_image(openpyxl_img, cell)
-
-        # Adjust cell size to fit the image
-        img_width, img_height = img.size
-        ws.row_dimensions[idx].height = img_height * 0.8
-        ws.column_dimensions['B'].width = img_width / 7.18
-        
-        # Apply border to the cell containing the image
-        image_cell = ws.cell(row=idx, column=2)
-        image_cell.border = thin_border
-
-        # Add a cell with border to the third column (Kwota)
-        kwota_cell = ws.cell(row=idx, column=3, value="")
-        kwota_cell.border = thin_border
-        kwota_cell.alignment = Alignment(horizontal='center', vertical='center')
-        kwota_cell.font = Font(name='Arial', size=12)
-
-    # Add the "SUMA" row
-    suma_row = len(images) + start_row
-    ws.merge_cells(f'A{suma_row}:B{suma_row}')
-    suma_cell = ws.cell(row=suma_row, column=1, value="SUMA")
-    suma_cell.alignment = Alignment(horizontal='center', vertical='center')
-    suma_cell.font = Font(name='Arial', size=12, bold=True)
-    suma_cell.border = thick_border
-
-    # Add the empty cell with a thicker border to the right of "SUMA"
-    total_cell = ws.cell(row=suma_row, column=3, value="")
-    total_cell.border = thick_border
-    total_cell.alignment = Alignment(horizontal='center', vertical='center')
-
-    wb.save(output_path)
+            # Adjust row height to fit the image
+            img_width, img_height = cell_image_size(img, cell_height)
+            ws.row_dimensions[idx].height = img_height * 0.8
 
-# USAGE
+            # Number, bordered image cell and an empty "Kwota" cell
+            ws.append([
+                styled_cell(idx - start_row + 1, thin_border, center, regular_font),
+                styled_cell(border=thin_border),
+                styled_cell("", thin_border, center, regular_font),
+            ])
+    except BaseException:
+        # Close the half-written sheet so its temporary file is released cleanly
+        ws.close()
+        raise
 
-# Create the main window
-root = TkinterDnD.Tk()
+    # Add the "SUMA" row with the empty total cell to its right
+    suma_row = image_count + start_row
+    ws.merged_cells.add(f'A{suma_row}:B{suma_row}')
+    ws.append([styled_cell("SUMA", thick_border, center, bold_font), None, styled_cell("", thick_border, center)])
 
-# Set the title of the window
-root.title("Kreator podsumowań")
+    if profiler is None:
+        wb.save(output_path)
+    else:
+        with profiler.measure("save"):
+            wb.save(output_path)
+
+def find_pdf_files(paths):
+    # Expand directories into the PDF files they contain, keeping the given order
+    pdf_files = []
+    for path in paths:
+        if os.path.isdir(path):
+            names = sorted(name for name in os.listdir(path) if name.lower().endswith(".pdf"))
+            pdf_files.extend(os.path.join(path, name) for name in names)
+        elif os.path.isfile(path):
+            pdf_files.append(path)
+        else:
+            raise FileNotFoundError("No such file or directory: " + path)
+    return pdf_files
 
-# Set the background color of the window to white
-root.configure(bg="white")
+def positive_int(value):
+    import argparse
 
-# Set the window size
-root.geometry("400x350")
+    # argparse type for options that only make sense above zero
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be a positive integer, got {value}")
+    return number
 
-# Disable window resizing
-root.resizable(False, False)
-    
-# Create a frame for the drag-and-drop area
-frame = tk.Frame(root, bg="white smoke", bd=2, relief=tk.SUNKEN, width=350, height=200)
-frame.pack(pady=(20, 10), padx=20)
-frame.pack_propagate(False)  # Prevent the frame from resizing with its content
+def output_path_for(pdf_path, output=None, output_is_dir=False):
+    # Next to the PDF by default, inside `output` when it is a directory, otherwise `output` itself
+    if output is None:
+        return os.path.splitext(pdf_path)[0] + ".xlsx"
+    if output_is_dir:
+        return os.path.join(output, os.path.splitext(os.path.basename(pdf_path))[0] + ".xlsx")
+    return output
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert PDF class rosters into xlsx summaries. Starts the window when no input is given.")
+    parser.add_argument("inputs", nargs="*", help="PDF files or directories containing PDF files")
+    parser.add_argument("-o", "--output", help="output xlsx file (single input) or directory")
+    parser.add_argument("--dpi", type=int, default=BASE_DPI, help="rendering resolution (default: %(default)s)")
+    parser.add_argument("--clip", action="store_true", help="estimate skew at low resolution and render only the padded name region")
+    parser.add_argument("--fast-deskew", action="store_true", help="estimate skew at low resolution and warp only the name region")
+    parser.add_argument("--extract-scans", action="store_true", help="crop scanned pages straight from their embedded image instead of rendering them")
+    parser.add_argument("--encoding", choices=ENCODINGS, default="gray", help="how crops are stored in the workbook (default: %(default)s)")
+    parser.add_argument("--cell-height", type=positive_int, metavar="PX", help="scale crops taller than PX pixels down to that height")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes, 1 runs serially (default: %(default)s)")
+    checks = parser.add_mutually_exclusive_group()
+    checks.add_argument("--check-deskew", action="store_true", help="only compare fast and full-resolution skew angles")
+    checks.add_argument("--check-enhance", action="store_true", help="only compare the fused enhancement with the original PIL/OpenCV chain")
+    parser.add_argument("--cache", action="store_true", help=f"reuse crops of unchanged pages from earlier runs, cached in {CACHE_DIR_ENV} or the user cache directory")
+    parser.add_argument("--cache-dir", metavar="DIR", help="like --cache, with the crops cached in DIR")
+    parser.add_argument("--profile", action="store_true", default=None, help=f"write a per-stage timing report next to each workbook (or set {PROFILE_ENV}=1)")
+    args = parser.parse_args(argv)
+
+    if not args.inputs:
+        run_gui()
+        return 0
+
+    try:
+        pdf_files = find_pdf_files(args.inputs)
+    except FileNotFoundError as e:
+        parser.error(str(e))
+    if not pdf_files:
+        parser.error("no PDF files found")
+
+    output_is_dir = args.output is not None and (len(pdf_files) > 1 or os.path.isdir(args.output))
+    if output_is_dir:
+        os.makedirs(args.output, exist_ok=True)
+
+    failed = 0
+    for pdf_path in pdf_files:
+        try:
+            if args.check_deskew:
+                outliers = check_fast_deskew(pdf_path, args.dpi)
+                for page_num, reference, fast in outliers:
+                    print(f"{pdf_path}: page {page_num + 1}: full {reference:.2f}, fast {fast:.2f}")
+                print(f"{pdf_path}: {len(outliers)} page(s) outside {SKEW_TOLERANCE} degree tolerance")
+                continue
+            if args.check_enhance:
+                outliers = check_enhance(pdf_path, args.dpi)
+                for page_num, difference in outliers:
+                    print(f"{pdf_path}: page {page_num + 1}: differs by up to {difference} gray levels")
+                print(f"{pdf_path}: {len(outliers)} page(s) outside {ENHANCE_TOLERANCE} gray level tolerance")
+                continue
+            output_path = output_path_for(pdf_path, args.output, output_is_dir)
+            process_pdf_to_excel(pdf_path, output_path, dpi=args.dpi, clip=args.clip, workers=args.workers, fast_deskew=args.fast_deskew, profile=args.profile, cache=args.cache_dir or args.cache, extract_scans=args.extract_scans, encoding=args.encoding, cell_height=args.cell_height)
+            print(f"{pdf_path} -> {output_path}")
+        except Exception as e:
+            failed += 1
+            print(f"{pdf_path}: {e}", file=sys.stderr)
+    return 1 if failed else 0
 
-# Create a label inside the frame for instructions
-label_drag = tk.Label(frame, text="Przeciągnij plik tutaj", font=("Helvetica", 14), fg="black", bg="white smoke")
-label_drag.pack(pady=(40, 10))
+def run_gui():
+    global root, label_file, label_browse, confirm_button, cache_enabled, filedialog
 
-# Create a label for "OR" with background
-label_or = tk.Label(frame, text="LUB", font=("Helvetica", 12), fg="dark gray", bg="white smoke")
-label_or.pack(pady=5)
+    # Interface imports
+    import tkinter as tk
+    from tkinterdnd2 import DND_FILES, TkinterDnD
+    from tkinter import filedialog
 
-# Create a horizontal line below the "OR" label
-canvas_line = tk.Canvas(frame, width=300, height=2, bd=0, highlightthickness=0)
-canvas_line.create_line(10, 1, 290, 1, fill="dark gray")
-canvas_line.pack()
+    # Create the main window
+    root = TkinterDnD.Tk()
 
-# Place the line on top of the "OR" label
-canvas_line.place(in_=label_or, relx=0.5, rely=0.5, anchor="s")
+    # Set the title of the window
+    root.title("Kreator podsumowań")
 
-# Bring the "OR" label to the front
-label_or.lift()
+    # Set the background color of the window to white
+    root.configure(bg="white")
 
-# Create a label for "Browse file"
-label_browse = tk.Label(frame, text="Wybierz z folderu", font=("Helvetica", 12), fg="blue", bg="white smoke", cursor="hand2")
-label_browse.pack(pady=(10, 40))
+    # Set the window size
+    root.geometry("400x380")
 
-# Create a label to display the selected file
-label_file = tk.Label(root, text="Nie wybrano jeszcze pliku.", font=("Helvetica", 10), wraplength=320, fg="black", bg="white")
-label_file.pack(pady=10)
+    # Disable window resizing
+    root.resizable(False, False)
 
-# Create a frame for the buttons
-button_frame = tk.Frame(root, bg="white")
-button_frame.pack(fill=tk.X, padx=25, pady=10)
+    # Create a frame for the drag-and-drop area
+    frame = tk.Frame(root, bg="white smoke", bd=2, relief=tk.SUNKEN, width=350, height=200)
+    frame.pack(pady=(20, 10), padx=20)
+    frame.pack_propagate(False)  # Prevent the frame from resizing with its content
 
-# Create buttons
-confirm_button = tk.Button(button_frame, text="Zatwierdź", command=confirm, bg="pale green", fg="black", padx=10)
-confirm_button.pack(side=tk.RIGHT)
+    # Create a label inside the frame for instructions
+    label_drag = tk.Label(frame, text="Przeciągnij plik tutaj", font=("Helvetica", 14), fg="black", bg="white smoke")
+    label_drag.pack(pady=(40, 10))
 
-cancel_button = tk.Button(button_frame, text="Anuluj", command=cancel, bg="lightgray", fg="black", padx=10)
-cancel_button.pack(side=tk.RIGHT, padx=5)
+    # Create a label for "OR" with background
+    label_or = tk.Label(frame, text="LUB", font=("Helvetica", 12), fg="dark gray", bg="white smoke")
+    label_or.pack(pady=5)
 
-# Enable drag and drop functionality
-root.drop_target_register(DND_FILES)
-root.dnd_bind('<<Drop>>', drop)
+    # Create a horizontal line below the "OR" label
+    canvas_line = tk.Canvas(frame, width=300, height=2, bd=0, highlightthickness=0)
+    canvas_line.create_line(10, 1, 290, 1, fill="dark gray")
+    canvas_line.pack()
 
-# Bind the browse label to the file dialog
-label_browse.bind("<Button-1>", lambda e: browse_file())
+    # Place the line on top of the "OR" label
+    canvas_line.place(in_=label_or, relx=0.5, rely=0.5, anchor="s")
+
+    # Bring the "OR" label to the front
+    label_or.lift()
+
+    # Create a label for "Browse file"
+    label_browse = tk.Label(frame, text="Wybierz z folderu", font=("Helvetica", 12), fg="blue", bg="white smoke", cursor="hand2")
+    label_browse.pack(pady=(10, 40))
+
+    # Create a label to display the selected file
+    label_file = tk.Label(root, text="Nie wybrano jeszcze pliku.", font=("Helvetica", 10), wraplength=320, fg="black", bg="white")
+    label_file.pack(pady=10)
+
+    # Opt-in crop cache: re-running the same roster only processes the changed pages
+    cache_enabled = tk.BooleanVar(value=False)
+    cache_check = tk.Checkbutton(root, text=f"Zapamiętuj przetworzone strony na dysku (do {CACHE_MAX_BYTES // 2 ** 20} MB)", variable=cache_enabled, font=("Helvetica", 10), bg="white", activebackground="white")
+    cache_check.pack()
+
+    # Create a frame for the buttons
+    button_frame = tk.Frame(root, bg="white")
+    button_frame.pack(fill=tk.X, padx=25, pady=10)
+
+    # Create buttons
+    confirm_button = tk.Button(button_frame, text="Zatwierdź", command=confirm, bg="pale green", fg="black", padx=10)
+    confirm_button.pack(side=tk.RIGHT)
+
+    cancel_button = tk.Button(button_frame, text="Anuluj", command=cancel, bg="lightgray", fg="black", padx=10)
+    cancel_button.pack(side=tk.RIGHT, padx=5)
+
+    # Enable drag and drop functionality
+    root.drop_target_register(DND_FILES)
+    root.dnd_bind('<<Drop>>', drop)
+
+    # Bind the browse label to the file dialog
+    label_browse.bind("<Button-1>", lambda e: browse_file())
+
+    # Bind hover events to change the color and underline
+    label_browse.bind("<Enter>", on_enter)
+    label_browse.bind("<Leave>", on_leave)
+
+    # Run the main loop
+    root.mainloop()
+
+# USAGE
 
-# Bind hover events to change the color and underline
-label_browse.bind("<Enter>", on_enter)
-label_browse.bind("<Leave>", on_leave)
+if __name__ == "__main__":
+    import multiprocessing
 
-# Run the main loop
-root.mainloop()
\ No newline at end of file
+    # Needed by worker processes in the frozen (PyInstaller) build
+    multiprocessing.freeze_support()
+    sys.exit(main())
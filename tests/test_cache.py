@@ -0,0 +1,137 @@
+import os
+
+import pytest
+
+fitz = pytest.importorskip("fitz")
+np = pytest.importorskip("numpy")
+pytest.importorskip("openpyxl")
+
+import benchmark
+import main
+
+@pytest.fixture
+def roster(tmp_path):
+    pdf_path = str(tmp_path / "roster.pdf")
+    benchmark.make_roster_pdf(pdf_path, pages=3, seed=3)
+    return pdf_path
+
+def fingerprints(pdf_path):
+    with fitz.open(pdf_path) as doc:
+        return [main.page_fingerprint(page) for page in doc]
+
+def cached_crops(pdf_path, cache_dir, process):
+    cache = main.CropCache(str(cache_dir))
+    return list(cache.iter_crops(pdf_path, main.processing_key(), process))
+
+def counting_process(pdf_path, calls):
+    # process() for iter_crops that records which pages it was asked for
+    def process(page_numbers=None):
+        calls.append(list(page_numbers))
+        return main.iter_name_crops(pdf_path, page_numbers=page_numbers)
+    return process
+
+def test_shifted_page_box_changes_fingerprint(roster, tmp_path):
+    # Moving the mediabox keeps page.rect the same but moves the name region
+    shifted = str(tmp_path / "shifted.pdf")
+    with fitz.open(roster) as doc:
+        box = doc[0].mediabox
+        doc[0].set_mediabox(fitz.Rect(box.x0 + 30, box.y0 - 30, box.x1 + 30, box.y1 - 30))
+        doc.save(shifted)
+    before, after = fingerprints(roster), fingerprints(shifted)
+    assert before[0] != after[0]
+    assert before[1:] == after[1:]
+
+def test_annotation_changes_fingerprint(roster, tmp_path):
+    annotated = str(tmp_path / "annotated.pdf")
+    with fitz.open(roster) as doc:
+        annot = doc[0].add_freetext_annot(fitz.Rect(main.NAME_CROP_BOX), "Inne nazwisko", fontsize=12)
+        annot.update()
+        doc.save(annotated)
+    before, after = fingerprints(roster), fingerprints(annotated)
+    assert before[0] != after[0]
+    assert before[1:] == after[1:]
+
+def test_appended_pages_reuse_cached_crops(roster, tmp_path):
+    calls = []
+    first = cached_crops(roster, tmp_path / "cache", counting_process(roster, calls))
+    assert calls == [[0, 1, 2]]
+
+    # The same document with two more pages: only the new pages are processed
+    extra = str(tmp_path / "extra.pdf")
+    benchmark.make_roster_pdf(extra, pages=2, seed=4)
+    longer = str(tmp_path / "longer.pdf")
+    with fitz.open(roster) as doc, fitz.open(extra) as more:
+        doc.insert_pdf(more)
+        doc.save(longer)
+    calls.clear()
+    crops = cached_crops(longer, tmp_path / "cache", counting_process(longer, calls))
+    assert calls == [[3, 4]]
+    assert len(crops) == 5
+    for cached, original in zip(crops, first):
+        assert np.array_equal(np.asarray(cached), np.asarray(original))
+
+def test_damaged_entries_are_processed_again(roster, tmp_path):
+    cache_dir = tmp_path / "cache"
+    first = cached_crops(roster, cache_dir, counting_process(roster, []))
+    cache = main.CropCache(str(cache_dir))
+    keys = [cache.key(fingerprint, main.processing_key()) for fingerprint in fingerprints(roster)]
+    with open(cache.path(keys[1]), "wb") as f:
+        f.write(b"not a png")
+
+    calls = []
+    crops = cached_crops(roster, cache_dir, counting_process(roster, calls))
+    assert calls == [[1]]
+    for crop, original in zip(crops, first):
+        assert np.array_equal(np.asarray(crop), np.asarray(original))
+
+def test_damaged_entry_between_missing_pages(roster, tmp_path):
+    # The running pipeline is stopped and restarted from the damaged page, never run twice at once
+    cache_dir = tmp_path / "cache"
+    first = cached_crops(roster, cache_dir, counting_process(roster, []))
+    cache = main.CropCache(str(cache_dir))
+    keys = [cache.key(fingerprint, main.processing_key()) for fingerprint in fingerprints(roster)]
+    os.remove(cache.path(keys[0]))
+    os.remove(cache.path(keys[2]))
+    with open(cache.path(keys[1]), "wb") as f:
+        f.write(b"not a png")
+
+    calls = []
+    crops = cached_crops(roster, cache_dir, counting_process(roster, calls))
+    assert calls == [[0, 2], [1, 2]]
+    for crop, original in zip(crops, first):
+        assert np.array_equal(np.asarray(crop), np.asarray(original))
+
+def test_trim_leaves_other_files_alone(roster, tmp_path):
+    cache_dir = tmp_path / "cache"
+    cached_crops(roster, cache_dir, counting_process(roster, []))
+    (cache_dir / "important.dat").write_bytes(b"x" * 1000)
+    (cache_dir / "ab").mkdir(exist_ok=True)
+    (cache_dir / "ab" / "notes.png").write_bytes(b"x" * 1000)
+
+    main.CropCache(str(cache_dir), max_bytes=0).trim()
+    assert (cache_dir / "important.dat").exists()
+    assert (cache_dir / "ab" / "notes.png").exists()
+    assert not any(name.endswith(".png") and len(name) == 68 for _, _, names in os.walk(cache_dir) for name in names)
+
+def workbook_images(xlsx_path):
+    import io
+    import re
+    import zipfile
+
+    from PIL import Image
+
+    # The embedded crops in sheet order, as arrays
+    with zipfile.ZipFile(xlsx_path) as package:
+        names = [name for name in package.namelist() if name.startswith("xl/media/")]
+        names.sort(key=lambda name: int(re.findall(r"\d+", name)[-1]))
+        return [np.asarray(Image.open(io.BytesIO(package.read(name)))) for name in names]
+
+def test_cached_workbook_matches_uncached(roster, tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    main.process_pdf_to_excel(roster, str(tmp_path / "first.xlsx"), cache=cache_dir)
+    main.process_pdf_to_excel(roster, str(tmp_path / "cached.xlsx"), cache=cache_dir)
+    main.process_pdf_to_excel(roster, str(tmp_path / "plain.xlsx"))
+    cached, plain = workbook_images(tmp_path / "cached.xlsx"), workbook_images(tmp_path / "plain.xlsx")
+    assert len(cached) == len(plain) == 3
+    for cached_image, plain_image in zip(cached, plain):
+        assert np.array_equal(cached_image, plain_image)
@@ -0,0 +1,35 @@
+import pytest
+
+pytest.importorskip("fitz")
+pytest.importorskip("cv2")
+
+import benchmark
+import main
+
+@pytest.mark.parametrize("skew", [-2.0, 0.0, 1.5, 3.0])
+def test_fast_angle_within_tolerance(tmp_path, skew):
+    # The low-resolution estimate agrees with correct_skew's full-resolution one
+    pdf_path = str(tmp_path / "roster.pdf")
+    benchmark.make_roster_pdf(pdf_path, pages=2, skew=skew, seed=1)
+    assert main.check_fast_deskew(pdf_path) == []
+
+@pytest.mark.parametrize("skew", [-2.0, 1.5, 3.0])
+def test_fast_angle_undoes_skew(tmp_path, skew):
+    # The scan is rotated by `skew`, so the correction is about -skew, within one Hough step
+    import fitz  # PyMuPDF
+
+    pdf_path = str(tmp_path / "roster.pdf")
+    benchmark.make_roster_pdf(pdf_path, pages=1, skew=skew, seed=1)
+    with fitz.open(pdf_path) as doc:
+        angle = main.estimate_page_skew(doc.load_page(0))
+    assert abs(angle + skew) <= main.SKEW_TOLERANCE
+
+def test_fast_deskew_crop_size(tmp_path):
+    import fitz  # PyMuPDF
+
+    pdf_path = str(tmp_path / "roster.pdf")
+    benchmark.make_roster_pdf(pdf_path, pages=1, seed=1)
+    box = main.name_crop_box(main.BASE_DPI)
+    with fitz.open(pdf_path) as doc:
+        crop = main.fast_deskew_name(doc.load_page(0))
+    assert crop.size == (box[2] - box[0], box[3] - box[1])
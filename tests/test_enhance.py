@@ -0,0 +1,46 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+Image = pytest.importorskip("PIL.Image")
+
+import main
+
+def generated_crops(seed=0):
+    # Noisy, flat, low-contrast and color crops of the name box size and a few others
+    rng = np.random.default_rng(seed)
+    crops = []
+    for size in [(173, 36), (360, 75), (40, 12)]:
+        width, height = size
+        crops.append(Image.fromarray(rng.integers(0, 256, (height, width), dtype=np.uint8)))
+        crops.append(Image.fromarray(rng.integers(0, 256, (height, width, 3), dtype=np.uint8)))
+        crops.append(Image.new("L", size, 200))
+        crops.append(Image.fromarray(rng.integers(120, 136, (height, width), dtype=np.uint8)))
+        text = np.full((height, width), 235, dtype=np.uint8)
+        text[height // 3:2 * height // 3, width // 8:7 * width // 8:3] = 30
+        crops.append(Image.fromarray(text))
+    return crops
+
+def assert_same(enhanced, reference):
+    assert enhanced.size == reference.size
+    assert np.array_equal(np.asarray(enhanced), np.asarray(reference))
+
+@pytest.mark.parametrize("crop", generated_crops(), ids=lambda crop: f"{crop.mode}-{crop.width}x{crop.height}")
+def test_enhance_image_matches_reference(crop):
+    assert_same(main.enhance_image(crop), main.enhance_image_reference(crop))
+
+def test_enhance_images_mixed_size_batch():
+    crops = generated_crops(seed=1)
+    enhanced = main.enhance_images(crops)
+    assert len(enhanced) == len(crops)
+    for crop, image in zip(crops, enhanced):
+        assert_same(image, main.enhance_image_reference(crop))
+
+@pytest.mark.parametrize("mode", ["1", "P", "RGBA", "LA", "I"])
+def test_enhance_image_other_modes(mode):
+    rng = np.random.default_rng(2)
+    crop = Image.fromarray(rng.integers(0, 256, (36, 173, 3), dtype=np.uint8)).convert(mode)
+    assert_same(main.enhance_image(crop), main.enhance_image_reference(crop))
+
+def test_enhance_images_empty():
+    assert main.enhance_images([]) == []
@@ -0,0 +1,93 @@
+import pytest
+
+fitz = pytest.importorskip("fitz")
+np = pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+
+import benchmark
+import main
+
+# Largest accepted mean difference between an extracted and a rendered crop, in gray levels;
+# the two paths resample the noisy scan differently, misaligned crops differ by far more
+SCAN_CROP_TOLERANCE = 8
+
+@pytest.fixture(scope="module")
+def roster(tmp_path_factory):
+    pdf_path = str(tmp_path_factory.mktemp("scan") / "roster.pdf")
+    benchmark.make_roster_pdf(pdf_path, pages=3, skew=1.5, seed=5)
+    return pdf_path
+
+@pytest.fixture
+def scan_doc(roster):
+    doc = fitz.open(roster)
+    yield doc
+    doc.close()
+
+def mean_difference(image, reference):
+    return np.abs(np.asarray(image.convert("L"), dtype=float) - np.asarray(reference.convert("L"), dtype=float)).mean()
+
+def scan_bytes(doc):
+    return doc.extract_image(doc[0].get_images()[0][0])["image"]
+
+def test_scan_image_finds_page_scan(scan_doc):
+    for page in scan_doc:
+        xref, rect = main.scan_image(page)
+        assert xref == page.get_images()[0][0]
+        assert rect == page.get_image_rects(xref)[0]
+
+@pytest.mark.parametrize("dpi", [main.BASE_DPI, 150])
+def test_scan_crop_close_to_rendered_crop(scan_doc, dpi):
+    for page in scan_doc:
+        crop = main.scan_name_crop(page, dpi)
+        reference = main.extract_crop(page, dpi)
+        assert crop.size == reference.size
+        assert mean_difference(crop, reference) < SCAN_CROP_TOLERANCE
+
+def test_scan_crop_of_partial_page_image(scan_doc):
+    # A scan placed in part of a larger page maps into image pixels through its placement
+    doc = fitz.open()
+    page = doc.new_page(width=700, height=900)
+    page.insert_image(fitz.Rect(60, 40, 655, 882), stream=scan_bytes(scan_doc))
+    assert main.scan_image(page) is not None
+    assert mean_difference(main.scan_name_crop(page), main.extract_crop(page, fast_deskew=True)) < SCAN_CROP_TOLERANCE
+
+def test_falls_back_on_text(scan_doc):
+    page = scan_doc[0]
+    page.insert_text((60, 400), "Dopisek", fontsize=12)
+    assert main.scan_image(page) is None
+    assert main.extract_crop(page, extract_scans=True).size == main.extract_crop(page).size
+
+def test_falls_back_on_form_xobject(scan_doc):
+    # show_pdf_page places the scanned page as a form XObject
+    doc = fitz.open()
+    page = doc.new_page(width=595, height=842)
+    page.show_pdf_page(page.rect, scan_doc, 0)
+    assert main.scan_image(page) is None
+
+def test_falls_back_on_rotation(scan_doc):
+    page = scan_doc[0]
+    page.set_rotation(90)
+    assert main.scan_image(page) is None
+
+def test_falls_back_on_flipped_placement(scan_doc):
+    page = scan_doc[0]
+    name = page.get_images(full=True)[0][7]
+    scan_doc.update_stream(page.get_contents()[0], f"q 595 0 0 842 0 0 cm /{name} Do Q".encode())
+    assert main.scan_image(page) is not None
+    scan_doc.update_stream(page.get_contents()[0], f"q 595 0 0 -842 0 842 cm /{name} Do Q".encode())
+    assert main.scan_image(page) is None
+
+def test_falls_back_on_smask():
+    import io
+
+    from PIL import Image
+
+    # A PNG with an alpha channel is stored with an SMask
+    image = Image.new("RGBA", (200, 280), (255, 255, 255, 128))
+    png = io.BytesIO()
+    image.save(png, format="PNG")
+    doc = fitz.open()
+    page = doc.new_page(width=595, height=842)
+    page.insert_image(page.rect, stream=png.getvalue())
+    assert page.get_images(full=True)[0][1] != 0
+    assert main.scan_image(page) is None